@@ -1,5 +1,5 @@
-from omr_processor import OMRProcessor
-import json
+from omr_processor import OMRProcessor, group_question_responses
+from main import _save_report
 import os
 import cv2
 import argparse
@@ -17,11 +17,11 @@ def generate_key(pdf_path, output_path='answer_key.json', template_path='templat
     processor = OMRProcessor(template_path)
     
     # Process PDF to get image
+    # Stream pages instead of materializing the full document: the master
+    # key lives on page 1, so no other page is ever rendered.
     try:
-        images = processor.process_pdf(pdf_path)
-        if images:
-            image = images[0]
-        else:
+        image = next(processor.iter_pdf_pages(pdf_path), None)
+        if image is None:
             raise Exception("No images found in PDF")
     except Exception as e:
         print(f"Error processing PDF: {e}")
@@ -45,15 +45,9 @@ def generate_key(pdf_path, output_path='answer_key.json', template_path='templat
     # 4. Extract Answers
     answers = {}
     
-    # Group by question number
-    q_groups = {}
-    for b in evaluated_bubbles:
-        if 'q' in b.get('id', '') and b.get('group', '').startswith('col'):
-            q_num = str(b.get('question'))
-            if q_num not in q_groups: q_groups[q_num] = []
-            if b.get('filled'):
-                q_groups[q_num].append(b['value'])
-                
+    # Group by question number (vectorized groupby shared with main.py)
+    q_groups = group_question_responses(evaluated_bubbles)
+
     # Finalize Answer Key
     for q, selected in q_groups.items():
         if len(selected) == 1:
@@ -67,14 +61,13 @@ def generate_key(pdf_path, output_path='answer_key.json', template_path='templat
         # If 0, we don't include it in the key (or empty string)
 
     # Sort checks?
-    # Save to JSON
+    # Save to JSON (same orjson-or-stdlib writer as the report in main.py)
     key_structure = {
         "answers": answers
     }
-    
-    with open(output_path, 'w') as f:
-        json.dump(key_structure, f, indent=2)
-        
+
+    _save_report(key_structure, output_path)
+
     print(f"\nSuccess! Generated answer key with {len(answers)} items.")
     print(f"Saved to: {output_path}")
 